@@ -1,28 +1,34 @@
 import pylast
 import time
 import pickle
+from instrument import metrics
 
-def get_doc_term(artists, filename, attempts=50):
+def get_doc_term(artists, filename, attempts=50, profile=None):
     docs = []
     ntags_dist = []
-    for i, a in enumerate(artists):
-        print(i, a, end=' ')
-        for _ in range(attempts):
-            try:
-                tags = {t.item: t.weight for t in a.get_top_tags()}
-                docs.append((a, tags))
-                ntags_dist.append(len(tags))
-                print(len(tags))
-            except Exception as e:
-                print(e)
-                print('Waiting 5 seconds...')
-                time.sleep(5)
-                continue
-            break
+    with metrics.stage('document.get_doc_term', total=len(artists), profile=profile) as stage:
+        for i, a in enumerate(artists):
+            print(i, a, end=' ')
+            for _ in range(attempts):
+                stage.count('api_calls')
+                try:
+                    tags = {t.item: t.weight for t in a.get_top_tags()}
+                    docs.append((a, tags))
+                    ntags_dist.append(len(tags))
+                    print(len(tags))
+                except Exception as e:
+                    print(e)
+                    print('Waiting 5 seconds...')
+                    stage.count('retries')
+                    time.sleep(5)
+                    continue
+                break
+            stage.update()
     with open(filename, 'wb') as f:
         pickle.dump((docs, ntags_dist), f)
     return docs, ntags_dist
 
 with open('walk_additions.pkl', 'rb') as f:
     artists, _ = pickle.load(f)
-    get_doc_term(artists, 'document_additions.pkl')
\ No newline at end of file
+    get_doc_term(artists, 'document_additions.pkl')
+    metrics.save('document_additions_metrics.json')
\ No newline at end of file
@@ -0,0 +1,140 @@
+""" NOTES
+Lightweight per-stage instrumentation for long crawls and training runs.
+Each stage keeps a timer, named counters (api calls, retries, cache hits,
+bmu evaluations, ...) and an item count for throughput. Progress is only
+printed every `interval` seconds, so calling update() in a tight inner loop
+stays cheap, unlike a per-item progress bar. A stage can optionally be run
+under cProfile. All finished stages can be exported to a JSON or CSV file.
+"""
+
+import sys
+import csv
+import json
+import time
+import cProfile
+import pstats
+
+
+class Stage(object):
+    def __init__(self, name, total=None, interval=5.0, profile=None, stream=sys.stdout):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.profile = profile      # filename for cProfile stats, or None
+        self.stream = stream
+        self.items = 0
+        self.counters = {}
+        self.start_time = None
+        self.end_time = None
+        self.last_report = None
+        self.profiler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.stop()
+
+    def start(self):
+        self.start_time = self.last_report = time.perf_counter()
+        if self.profile is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile)
+        self.end_time = time.perf_counter()
+        self.report(final=True)
+
+    def count(self, key, n=1):
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def update(self, n=1):
+        self.items += n
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        return end - self.start_time
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.items/elapsed if elapsed > 0 else 0.0
+
+    def report(self, final=False):
+        if self.stream is None:
+            return
+        line = '[{}] {} items'.format(self.name, self.items)
+        if self.total:
+            line += ' of {} ({:.0%})'.format(self.total, self.items/self.total)
+        line += ', {:.1f}/s, {:.1f}s elapsed'.format(self.rate(), self.elapsed())
+        if not final and self.total and self.rate() > 0:
+            line += ', eta {:.0f}s'.format((self.total - self.items)/self.rate())
+        if self.counters:
+            line += ', ' + ', '.join('{}={}'.format(k, v) for k, v in sorted(self.counters.items()))
+        print(line, file=self.stream)
+
+    def summary(self):
+        summary = {'stage': self.name, 'items': self.items, 'total': self.total,
+            'elapsed': self.elapsed(), 'rate': self.rate()}
+        summary.update(self.counters)
+        return summary
+
+    def print_profile(self, limit=20, sort='cumulative'):
+        if self.stream is None:
+            return
+        if self.profile is None:
+            print('Stage {} was not profiled.'.format(self.name), file=self.stream)
+        else:
+            pstats.Stats(self.profile, stream=self.stream).sort_stats(sort).print_stats(limit)
+
+
+class Metrics(object):
+    def __init__(self):
+        self.stages = []
+
+    def stage(self, name, **kwargs):
+        stage = Stage(name, **kwargs)
+        self.stages.append(stage)
+        return stage
+
+    def merge(self, summaries):
+        """ add stages that were recorded elsewhere, e.g. in a worker process """
+        for summary in summaries:
+            summary = dict(summary)
+            stage = Stage(summary.pop('stage'), total=summary.pop('total'), stream=None)
+            stage.items = summary.pop('items')
+            stage.start_time, stage.end_time = 0.0, summary.pop('elapsed')
+            summary.pop('rate')
+            stage.counters = summary
+            self.stages.append(stage)
+
+    def summaries(self):
+        return [stage.summary() for stage in self.stages]
+
+    def save(self, filename):
+        """ write every stage summary to a .json or .csv file """
+        summaries = self.summaries()
+        if filename.endswith('.csv'):
+            fields = ['stage', 'items', 'total', 'elapsed', 'rate']
+            for summary in summaries:
+                fields += [k for k in summary if k not in fields]
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(summaries)
+        else:
+            with open(filename, 'w') as f:
+                json.dump(summaries, f, indent=2)
+
+
+# shared across modules, so one run collects every stage; call metrics.save(...) at the end
+metrics = Metrics()
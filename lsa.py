@@ -15,12 +15,9 @@ from scipy.linalg import svd
 import matplotlib.pyplot as plt; plt.style.use('ggplot')
 from sklearn.decomposition import TruncatedSVD
 
-with open('walker_data/tag_data15-02-08--16-34-35.p', 'rb') as f:
-    tag_data = pickle.load(f)
-
 class LSA(object):
-    def __init__(self, tag_data):
-        self.tag_data = tag_data[::100]
+    def __init__(self, tag_data, skip=100):
+        self.tag_data = tag_data[::skip]
 
     def term_doc(self):
         """ this creates a term-document matrix
@@ -96,6 +93,8 @@ class LSA(object):
         print(a)
 
 if __name__ == '__main__':
+    with open('walker_data/tag_data15-02-08--16-34-35.p', 'rb') as f:
+        tag_data = pickle.load(f)
     l = LSA(tag_data)
     l.term_doc()
     # l.test()
@@ -0,0 +1,256 @@
+""" NOTES
+Incremental runner for the tag data -> term-doc -> SVD -> SOM workflow.
+Every stage is keyed by a hash of its function source, the contents of the
+source files it declares as deps (e.g. lsa.py, som.py), its parameters and the
+keys of its inputs; file inputs are keyed by their contents. Artifacts are
+pickled to the cache directory under that key, so a stage reruns when any of
+those change, and every step downstream of a rerun step reruns with it, e.g. changing a SOM parameter will reuse the cached term-doc
+matrix and SVD factors. Code that is not declared as a dep, such as installed
+libraries, is not tracked; pass force to rerun a stage (and everything that
+depends on it) after upgrading them.
+Stages whose inputs are ready run in parallel worker processes, and the metrics
+they record there are merged back into instrument.metrics.
+Harvesting (walker.py) is interactive and open-ended, so it stays a manual
+step; its tag data pickle is the file input of the pipeline.
+"""
+
+import os
+import pickle
+import inspect
+import hashlib
+import time
+import argparse
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from instrument import metrics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Step(object):
+    def __init__(self, name, func=None, inputs=(), params=None, path=None, deps=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = params or {}
+        self.path = path        # set only for file inputs
+        self.deps = tuple(os.path.join(HERE, dep) for dep in deps)
+
+    def source_hash(self):
+        """ hash of the step function and of every source file it depends on;
+        the module name is left out, since it is '__main__' when run as a script """
+        try:
+            source = inspect.getsource(self.func)
+        except (OSError, TypeError):
+            source = ''
+        h = hashlib.sha1('{}\n{}'.format(self.func.__qualname__, source).encode())
+        for dep in self.deps:
+            h.update(file_hash(dep).encode())
+        return h.hexdigest()
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def run_step(name, func, args, params, profile=None):
+    """ call a step, timed where it actually runs, and return its value with the
+    summaries of the metrics stages it recorded, which would otherwise be lost
+    in a worker process; profile is a filename for the step's cProfile stats """
+    n = len(metrics.stages)
+    with metrics.stage('pipeline.' + name, profile=profile) as stage:
+        value = func(*args, **params)
+        stage.update()
+    return value, [stage.summary() for stage in metrics.stages[n:]]
+
+
+class Pipeline(object):
+    def __init__(self, cache_dir='data/cache', workers=1):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.steps = {}
+
+    def add_file(self, name, path):
+        self.steps[name] = Step(name, path=path)
+
+    def add(self, name, func, inputs=(), deps=(), **params):
+        """ func is called as func(*input_values, **params) and must be picklable
+        (a module-level function) to run in a worker process; deps are source
+        files, relative to this module, whose changes should invalidate the step """
+        for i in inputs:
+            if i not in self.steps:
+                raise KeyError("Unknown input '{}' for step '{}'.".format(i, name))
+        self.steps[name] = Step(name, func, inputs, params, deps=deps)
+
+    def order(self, targets=None):
+        """ topological order of the steps needed for targets (default all) """
+        order, seen = [], set()
+        def visit(name):
+            if name not in seen:
+                seen.add(name)
+                for i in self.steps[name].inputs:
+                    visit(i)
+                order.append(name)
+        for name in (self.steps if targets is None else targets):
+            visit(name)
+        return order
+
+    def keys(self, order):
+        keys = {}
+        for name in order:
+            step = self.steps[name]
+            h = hashlib.sha1()
+            if step.path is not None:
+                h.update(file_hash(step.path).encode())
+            else:
+                h.update(step.source_hash().encode())
+                h.update(repr(sorted(step.params.items())).encode())
+                for i in step.inputs:
+                    h.update(keys[i].encode())
+            keys[name] = h.hexdigest()[:16]
+        return keys
+
+    def artifact(self, name, key):
+        return os.path.join(self.cache_dir, '{}-{}.p'.format(name, key))
+
+    def load(self, name, key):
+        step = self.steps[name]
+        if step.path is not None:
+            return step.path
+        with open(self.artifact(name, key), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, name, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        filename = self.artifact(name, key)
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(filename + '.tmp', filename)     # never leave a half-written artifact
+
+    def run(self, targets=None, force=(), profile=()):
+        """ run the steps needed for targets, rerunning those without a cached
+        artifact, those named in force and everything downstream of either, and
+        return the targets' values; steps named in profile that run are profiled
+        to <cache_dir>/<step>.prof, which does not affect their cache keys """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        order = self.order(targets)
+        keys = self.keys(order)
+        computed = [name for name in order if self.steps[name].path is None]
+        summary = metrics.stage('pipeline', total=len(computed))
+        summary.start()
+        pending = []
+        for name in computed:
+            # keys only cover input keys, not values, so a rerun input may change what a cached step saw
+            if (name in force or any(i in pending for i in self.steps[name].inputs)
+                    or not os.path.exists(self.artifact(name, keys[name]))):
+                pending.append(name)
+            else:
+                summary.count('cache_hits')
+                summary.update()
+        done = set(order) - set(pending)
+        values = {}
+        def value(name):
+            if name not in values:
+                values[name] = self.load(name, keys[name])
+            return values[name]
+        executor = ProcessPoolExecutor if self.workers > 1 else ThreadPoolExecutor
+        futures = {}
+        try:
+            with executor(max_workers=self.workers) as ex:
+                while pending or futures:
+                    for name in [n for n in pending if done.issuperset(self.steps[n].inputs)]:
+                        step = self.steps[name]
+                        print('running {} ({})'.format(name, keys[name]))
+                        submitted = time.perf_counter()
+                        args = [value(i) for i in step.inputs]
+                        prof = os.path.join(self.cache_dir, name + '.prof') if name in profile else None
+                        futures[ex.submit(run_step, name, step.func, args, step.params, prof)] = (name, submitted)
+                        pending.remove(name)
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name, submitted = futures.pop(future)
+                        wall = time.perf_counter() - submitted
+                        values[name], summaries = future.result()
+                        if self.workers > 1:
+                            metrics.merge(summaries)
+                        # time spent loading inputs and waiting for a free worker
+                        stage = [s for s in metrics.stages if s.name == 'pipeline.' + name][-1]
+                        stage.count('queued', max(wall - stage.elapsed(), 0.0))
+                        self.save(name, keys[name], values[name])
+                        summary.count('steps_run')
+                        summary.update()
+                        done.add(name)
+        finally:
+            summary.stop()
+        return {name: value(name) for name in (self.steps if targets is None else targets)}
+
+
+# heavy imports are deferred to the steps so the runner itself only needs the stdlib
+def term_doc_step(tag_file, skip=100):
+    from lsa import LSA
+    with open(tag_file, 'rb') as f:
+        tag_data = pickle.load(f)
+    lsa = LSA(tag_data, skip=skip)
+    return lsa.term_doc(), lsa.term_labels, lsa.doc_labels
+
+def svd_step(term_doc, k=20, seed=42):
+    from sklearn.decomposition import TruncatedSVD
+    matrix, term_labels, doc_labels = term_doc
+    svd = TruncatedSVD(n_components=k, random_state=seed)
+    reduced = svd.fit_transform(matrix)
+    return reduced, svd.singular_values_, svd.components_, term_labels, doc_labels
+
+def som_step(factors, vectors='terms', grid_shape=(20, 20), nepochs=10, seed=42):
+    import numpy as np
+    from som import SOM
+    reduced, s, components, term_labels, doc_labels = factors
+    if vectors == 'terms':
+        vecs, labels = reduced, term_labels
+    else:
+        vecs, labels = components.T * s, doc_labels
+    np.random.seed(seed)
+    som = SOM(grid_shape=tuple(grid_shape), ndims=vecs.shape[1])
+    som.train(vecs, nepochs=nepochs)
+    return som.grid, som.get_locations(vecs, labels=labels)
+
+def build(tag_file, skip=100, k=20, grid_shape=(20, 20), nepochs=10, cache_dir='data/cache', workers=1):
+    pipe = Pipeline(cache_dir=cache_dir, workers=workers)
+    pipe.add_file('tags', tag_file)
+    pipe.add('term_doc', term_doc_step, ['tags'], deps=['lsa.py'], skip=skip)
+    pipe.add('svd', svd_step, ['term_doc'], k=k)
+    pipe.add('som_terms', som_step, ['svd'], deps=['som.py'],
+        vectors='terms', grid_shape=tuple(grid_shape), nepochs=nepochs)
+    pipe.add('som_artists', som_step, ['svd'], deps=['som.py'],
+        vectors='artists', grid_shape=tuple(grid_shape), nepochs=nepochs)
+    return pipe
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the clustering pipeline, reusing cached stages.')
+    parser.add_argument('-t', '--tags', dest='tags', help='tag data pickle (default: newest data/tag_data*.p)')
+    parser.add_argument('-s', '--skip', dest='skip', type=int, default=100, help='use every n-th artist.')
+    parser.add_argument('-k', dest='k', type=int, default=20, help='number of SVD components.')
+    parser.add_argument('-g', '--grid', dest='grid', type=int, nargs=2, default=[20, 20], help='SOM grid shape.')
+    parser.add_argument('-e', '--epochs', dest='nepochs', type=int, default=10, help='SOM training epochs.')
+    parser.add_argument('-w', '--workers', dest='workers', type=int, default=2, help='parallel worker processes.')
+    parser.add_argument('-c', '--cache', dest='cache', default='data/cache', help='artifact cache directory.')
+    parser.add_argument('-f', '--force', dest='force', nargs='+', default=[], help='steps to rerun regardless of cache.')
+    parser.add_argument('-p', '--profile', dest='profile', nargs='+', default=[], help='steps to run under cProfile.')
+    args = parser.parse_args()
+
+    tag_file = args.tags
+    if tag_file is None:
+        tag_files = glob('data/tag_data*.p')
+        if len(tag_files) == 0:
+            parser.error('no tag data found in data/, run walker.py gather_tags first')
+        tag_file = sorted(tag_files)[-1]    # get newest tag data
+
+    pipe = build(tag_file, skip=args.skip, k=args.k, grid_shape=args.grid, nepochs=args.nepochs,
+        cache_dir=args.cache, workers=args.workers)
+    results = pipe.run(targets=['som_terms', 'som_artists'], force=args.force, profile=args.profile)
+    for name, (grid, locations) in results.items():
+        print('{}: {} locations on a {} grid'.format(name, len(locations), grid.shape[:2]))
+    metrics.save(os.path.join(args.cache, 'pipeline_metrics.json'))
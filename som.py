@@ -1,7 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from random import choice
-from pyprind import ProgPercent
+from instrument import metrics
 
 def find_factorization(x):
     def loss(x, n, m):
@@ -60,46 +60,50 @@ class SOM(object):
         dist = np.linalg.norm(np.subtract(ind_winner, ind_other))
         return self.learn_weight() * np.exp(-dist**2 / (2 * sigma**2))
 
-    def update_grid(self, input_vec):
+    def find_bmu(self, vec):
         ind_min, dist_min = (0, 0), float('inf')
         for ind in np.ndindex(self.grid_shape):
-            dist = self.dist_func(self.grid[ind], input_vec)
+            dist = self.dist_func(self.grid[ind], vec)
             if dist < dist_min:
                 ind_min, dist_min = ind, dist
+        return ind_min
+
+    def update_grid(self, input_vec):
+        ind_min = self.find_bmu(input_vec)
         for ind in np.ndindex(self.grid_shape):
             neuron = self.grid[ind]
             dist = np.subtract(input_vec, neuron)
             delta = self.neighbor_weight(ind_min, ind) * dist
             self.grid[ind] += delta
 
-    def train(self, train_vecs, nepochs=10, save_history=False):
+    def train(self, train_vecs, nepochs=10, save_history=False, profile=None):
         print('starting training...')
-        pbar = ProgPercent(nepochs*len(train_vecs))
+        ncells = int(np.prod(self.grid_shape))
         self.nepochs = nepochs
-        for _ in range(nepochs):
-            for vec in train_vecs:
-                self.update_grid(vec)
-                pbar.update()
-            self.t += 1
-            if save_history:
-                self.history.append(self.grid.copy())
+        with metrics.stage('som.train', total=nepochs*len(train_vecs), profile=profile) as stage:
+            for _ in range(nepochs):
+                for vec in train_vecs:
+                    self.update_grid(vec)
+                    stage.update()
+                stage.count('bmu_evaluations', ncells*len(train_vecs))
+                self.t += 1
+                if save_history:
+                    self.history.append(self.grid.copy())
         print('done')
 
-    def get_locations(self, vecs, labels=None):
+    def get_locations(self, vecs, labels=None, profile=None):
         print('getting locations...')
-        pbar = ProgPercent(len(vecs)*np.prod(self.grid_shape))
+        ncells = int(np.prod(self.grid_shape))
         locations = {}
-        for i, v in enumerate(vecs):
-            ind_min, dist_min = (0, 0), float('inf')
-            for ind in np.ndindex(self.grid_shape):
-                dist = self.dist_func(self.grid[ind], v)
-                if dist < dist_min:
-                    ind_min, dist_min = ind, dist
-                pbar.update()
-            if labels is None:
-                locations[i] = ind_min
-            else:
-                locations[labels[i]] = ind_min
+        with metrics.stage('som.get_locations', total=len(vecs), profile=profile) as stage:
+            for i, v in enumerate(vecs):
+                ind_min = self.find_bmu(v)
+                if labels is None:
+                    locations[i] = ind_min
+                else:
+                    locations[labels[i]] = ind_min
+                stage.count('bmu_evaluations', ncells)
+                stage.update()
         print('done')
         return locations
 
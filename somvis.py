@@ -1,6 +1,7 @@
 from tagslda2 import TagsLDA
 from scipy.stats import entropy as divergence
 from som import SOM
+from instrument import metrics
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -19,6 +20,7 @@ def main():
 	areas = np.array([30*2*np.pi*score**2 for score in lda.topic_significances()])
 	areas_top, top_indices = zip(*sorted([(a, i) for i, a in enumerate(areas)], reverse=True)[:10])
 	locations = som.get_locations(vecs=lda.beta[top_indices, :], labels=labels)
+	metrics.save('data/somvis_metrics.json')
 
 	# print(locations)
 	labels, data = zip(*locations.items())
@@ -0,0 +1,68 @@
+import io
+import csv
+import json
+from instrument import Stage, Metrics
+
+
+def test_update_is_throttled():
+    stream = io.StringIO()
+    stage = Stage('throttled', total=100, interval=60, stream=stream)
+    stage.start()
+    for _ in range(50):
+        stage.update()
+    assert stream.getvalue() == ''
+    stage.interval = 0
+    stage.update()
+    assert stream.getvalue().startswith('[throttled] 51 items of 100')
+
+def test_summary_counters_and_rate():
+    stage = Stage('counted', stream=None)
+    stage.start()
+    stage.update(10)
+    stage.count('api_calls')
+    stage.count('api_calls', 2)
+    stage.count('retries')
+    stage.stop()
+    stage.start_time, stage.end_time = 0.0, 2.0
+    summary = stage.summary()
+    assert summary['items'] == 10
+    assert summary['api_calls'] == 3
+    assert summary['retries'] == 1
+    assert summary['elapsed'] == 2.0
+    assert summary['rate'] == 5.0
+
+def make_metrics():
+    metrics = Metrics()
+    with metrics.stage('first', stream=None) as stage:
+        stage.count('api_calls', 4)
+    with metrics.stage('second', stream=None) as stage:
+        stage.count('bmu_evaluations', 7)
+    return metrics
+
+def test_save_json(tmp_path):
+    filename = str(tmp_path / 'metrics.json')
+    make_metrics().save(filename)
+    with open(filename) as f:
+        summaries = json.load(f)
+    assert [s['stage'] for s in summaries] == ['first', 'second']
+    assert summaries[0]['api_calls'] == 4
+    assert summaries[1]['bmu_evaluations'] == 7
+
+def test_save_csv_header_covers_all_counters(tmp_path):
+    filename = str(tmp_path / 'metrics.csv')
+    make_metrics().save(filename)
+    with open(filename, newline='') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    assert reader.fieldnames == ['stage', 'items', 'total', 'elapsed', 'rate', 'api_calls', 'bmu_evaluations']
+    assert rows[0]['api_calls'] == '4' and rows[0]['bmu_evaluations'] == ''
+    assert rows[1]['api_calls'] == '' and rows[1]['bmu_evaluations'] == '7'
+
+def test_print_profile_respects_stream(tmp_path, capsys):
+    Stage('silent', stream=None).print_profile()
+    stream = io.StringIO()
+    with Stage('profiled', profile=str(tmp_path / 'stage.prof'), stream=stream) as stage:
+        sorted(range(1000))
+    stage.print_profile(limit=5)
+    assert capsys.readouterr().out == ''
+    assert 'function calls' in stream.getvalue()
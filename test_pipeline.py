@@ -0,0 +1,100 @@
+import pytest
+from instrument import metrics
+from pipeline import Pipeline
+
+calls = []
+
+def read(path, repeat=1):
+    calls.append('read')
+    with open(path) as f:
+        return f.read()*repeat
+
+def shout(text, suffix='!'):
+    calls.append('shout')
+    with metrics.stage('shout', stream=None) as stage:
+        stage.count('letters', len(text))
+    return text.upper() + suffix
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'tags.txt'
+    path.write_text('ab')
+    del calls[:]
+    return path
+
+def build(source, cache_dir, workers=1, repeat=1, suffix='!', dep=None):
+    pipe = Pipeline(cache_dir=str(cache_dir), workers=workers)
+    pipe.add_file('tags', str(source))
+    pipe.add('read', read, ['tags'], repeat=repeat)
+    pipe.add('shout', shout, ['read'], deps=[] if dep is None else [str(dep)], suffix=suffix)
+    return pipe
+
+def last_summary():
+    return [s for s in metrics.summaries() if s['stage'] == 'pipeline'][-1]
+
+
+def test_cold_then_warm_run(source, tmp_path):
+    assert build(source, tmp_path / 'cache').run(['shout']) == {'shout': 'AB!'}
+    assert calls == ['read', 'shout']
+    assert last_summary()['steps_run'] == 2
+    assert 'cache_hits' not in last_summary()
+    assert build(source, tmp_path / 'cache').run(['shout']) == {'shout': 'AB!'}
+    assert calls == ['read', 'shout']
+    assert last_summary()['cache_hits'] == 2
+
+def test_param_change_reuses_upstream(source, tmp_path):
+    build(source, tmp_path / 'cache').run(['shout'])
+    assert build(source, tmp_path / 'cache', suffix='?').run(['shout']) == {'shout': 'AB?'}
+    assert calls == ['read', 'shout', 'shout']
+
+def test_upstream_param_change_reruns_downstream(source, tmp_path):
+    build(source, tmp_path / 'cache').run(['shout'])
+    assert build(source, tmp_path / 'cache', repeat=2).run(['shout']) == {'shout': 'ABAB!'}
+    assert calls == ['read', 'shout', 'read', 'shout']
+
+def test_input_file_change_invalidates(source, tmp_path):
+    build(source, tmp_path / 'cache').run(['shout'])
+    source.write_text('cd')
+    assert build(source, tmp_path / 'cache').run(['shout']) == {'shout': 'CD!'}
+    assert calls == ['read', 'shout', 'read', 'shout']
+
+def test_dep_change_invalidates(source, tmp_path):
+    dep = tmp_path / 'dep.py'
+    dep.write_text('x = 1\n')
+    build(source, tmp_path / 'cache', dep=dep).run(['shout'])
+    dep.write_text('x = 2\n')
+    build(source, tmp_path / 'cache', dep=dep).run(['shout'])
+    assert calls == ['read', 'shout', 'shout']
+
+def test_force_reruns_step(source, tmp_path):
+    build(source, tmp_path / 'cache').run(['shout'])
+    build(source, tmp_path / 'cache').run(['shout'], force=['shout'])
+    assert calls == ['read', 'shout', 'shout']
+
+def test_force_reruns_downstream(source, tmp_path):
+    build(source, tmp_path / 'cache').run(['shout'])
+    build(source, tmp_path / 'cache').run(['shout'], force=['read'])
+    assert calls == ['read', 'shout', 'read', 'shout']
+    assert 'cache_hits' not in last_summary()
+
+def test_step_timing_excludes_queueing(source, tmp_path):
+    n = len(metrics.stages)
+    build(source, tmp_path / 'cache').run(['shout'])
+    steps = {s['stage']: s for s in metrics.summaries()[n:] if s['stage'].startswith('pipeline.')}
+    assert set(steps) == {'pipeline.read', 'pipeline.shout'}
+    assert all(s['items'] == 1 and s['queued'] >= 0 for s in steps.values())
+
+def test_profile_does_not_change_key(source, tmp_path):
+    build(source, tmp_path / 'cache').run(['shout'], profile=['shout'])
+    assert (tmp_path / 'cache' / 'shout.prof').exists()
+    build(source, tmp_path / 'cache').run(['shout'])
+    assert calls == ['read', 'shout']
+
+def test_worker_metrics_are_merged(source, tmp_path):
+    n = len(metrics.stages)
+    build(source, tmp_path / 'cache', workers=2).run(['shout'])
+    shouts = [s for s in metrics.summaries()[n:] if s['stage'] == 'shout']
+    assert len(shouts) == 1 and shouts[0]['letters'] == 2
+    steps = [s for s in metrics.summaries()[n:] if s['stage'] == 'pipeline.shout']
+    assert len(steps) == 1 and 'queued' in steps[0]
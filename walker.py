@@ -8,13 +8,14 @@ import os
 import time
 from glob import glob
 import curses
-import pyprind
+from instrument import metrics
 
 class Walker(object):
     def __init__(self):
         self.network = login()
         self.walk_data = None
         self.walk_filename = None
+        self.stage = None
 
     def __repr__(self):
         return 'Walk data:\n\t' + '; '.join(str(artist) for artist in self.walk_data)
@@ -66,14 +67,17 @@ class Walker(object):
             print("Could not find '{}'.".format(filename))
             new_walk()
 
-    def walk_forever(self, autosave=True):
+    def walk_forever(self, autosave=True, profile=None):
         # todo: curses
         if self.walk_data is None:
             print('Please first load/create walk data to walk forever.')
         else:
+            self.stage = metrics.stage('walker.walk_forever', profile=profile)
+            self.stage.start()
             try:
                 while True:
                     self.walk_data.append(self.step())
+                    self.stage.update()
                     if autosave:
                         with open(self.walk_filename, 'wb') as f:
                             pickle.dump(self.walk_data, f)
@@ -82,8 +86,12 @@ class Walker(object):
             except:
                 print('\nNumber of steps in walk: {}'.format(len(self.walk_data)))
                 raise
+            finally:
+                self.stage.stop()
+                self.stage = None
+                metrics.save(os.path.splitext(self.walk_filename)[0] + '_metrics.json')
 
-    def gather_tags(self, filename=None, outfile=None, autosave=True, show=False):
+    def gather_tags(self, filename=None, outfile=None, autosave=True, show=False, profile=None):
         if filename is None:
             filename = self.walk_filename
             if self.walk_data is None:
@@ -103,22 +111,30 @@ class Walker(object):
                 if show:
                     artist, tags = tag_data[-1]
                     print('Last gathered: {} {}'.format(artist, [str(t.item) for t in tags[:3]]))
-        pbar = pyprind.ProgPercent(len(self.walk_data) - len(tag_data))
+        stage = metrics.stage('walker.gather_tags', total=len(self.walk_data) - len(tag_data), profile=profile)
+        stage.count('resumed', len(tag_data))     # artists already gathered in a previous run
         print('{} artists left.'.format(len(self.walk_data) - len(tag_data)))
+        stage.start()
         try:
             if autosave:
                 print('Autosave feature is active...')
             for artist in self.walk_data[len(tag_data):]:
+                stage.count('api_calls')
                 tags = artist.get_top_tags(limit=100)
                 tag_data.append((artist, tags))
                 if autosave:
                     with open(outfile, 'wb') as f:
                         pickle.dump(tag_data, f)
-                pbar.update()
-        except:
+                stage.update()
+        except BaseException as e:
+            if not isinstance(e, KeyboardInterrupt):
+                stage.count('failures')
             with open(outfile, 'wb') as f:
                 pickle.dump(tag_data, f)
             print('\nJust finished with {} {}'.format(artist, [str(t.item) for t in tag_data[-1][1][:3]]))
+        finally:
+            stage.stop()
+            metrics.save(os.path.splitext(outfile)[0] + '_metrics.json')
 
 class MDWalker(Walker):
     def __init__(self, seed=None):
@@ -135,6 +151,8 @@ class MDWalker(Walker):
         else:
             last = self.walk_data[index]
         print(last)
+        if self.stage is not None:
+            self.stage.count('api_calls')
         similar = [ti.item for ti in last.get_similar(limit=self.max_degree)]     # max degree is 250 by Last.fm construction
         if len(similar) == self.max_degree:
             return choice(similar)